@@ -0,0 +1,67 @@
+#!/usr/bin/python3
+
+# clusterdial.py
+#
+# A stand-in DX cluster for testing RigDial's spot handling. Accepts telnet connections, reads the login
+# callsign and then sends made up spots on the HF bands at the given rate, in the usual "DX de" format.
+#
+# python3 clusterdial.py [spots-per-second] [port]
+
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License along with this program. If not,
+# see <https://www.gnu.org/licenses/>.
+
+# Having said that, it would be great to know if this software gets used. If you want, buy me a coffee, or send me some hardware
+# Darryl Smith, VK2TDS. darryl@radio-active.net.au Copyright 2023
+
+import sys
+import time
+import random
+import socket
+
+from threading import Thread
+
+
+HOST = "127.0.0.1"
+PORT = 7300     # Must match Settings.SpotPort in rigdial.py
+
+# Band segments in kHz to make spots in
+SEGMENTS = [(1800, 1875), (3500, 3800), (7000, 7300), (10100, 10150), (14000, 14350), (18068, 18168),
+        (21000, 21450), (24890, 24990), (28000, 29700), (50000, 54000)]
+PREFIXES = ["VK", "ZL", "JA", "K", "W", "G", "DL", "F", "EA", "PY", "ZS", "UA", "BY", "HL", "YB"]
+
+
+def spot():
+    low, high = random.choice(SEGMENTS)
+    freq = random.uniform(low, high)
+    call = "%s%d%s" % (random.choice(PREFIXES), random.randint(0, 9),
+            ''.join(random.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") for n in range(random.randint(1, 3))))
+    return "DX de VK2TDS:    %8.1f  %-12s %-30s %sZ\r\n" % (freq, call, "CQ", time.strftime("%H%M", time.gmtime()))
+
+
+def on_new_client(c, rate):
+    try:
+        c.sendall(b"login: ")
+        c.recv(1024)
+        while True:
+            c.sendall(spot().encode('utf-8'))
+            time.sleep(1.0 / rate)
+    except socket.error:
+        pass
+    c.close()
+
+
+if __name__ == "__main__":
+    rate = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else PORT
+    with socket.socket() as s:
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        s.bind((HOST, port))
+        s.listen(10)
+        print("Sending %.1f spots per second on port %d" % (rate, port))
+        while True:
+            c, addr = s.accept()
+            Thread(target=on_new_client, args=(c, rate)).start()
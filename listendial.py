@@ -0,0 +1,86 @@
+#!/usr/bin/python3
+
+# listendial.py
+#
+# Listens for the state datagrams sent by RigDial's StatePublisher and reports the delivery rate, gaps and
+# reordering from the sequence numbers. Handles both the json and binary formats.
+#
+# python3 listendial.py [group-or-host] [port]
+
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License along with this program. If not,
+# see <https://www.gnu.org/licenses/>.
+
+# Having said that, it would be great to know if this software gets used. If you want, buy me a coffee, or send me some hardware
+# Darryl Smith, VK2TDS. darryl@radio-active.net.au Copyright 2023
+
+import sys
+import time
+import json
+import socket
+import struct
+
+
+GROUP = "239.255.0.73"  # Must match Settings.PublishHost in rigdial.py
+PORT = 4533             # Must match Settings.PublishPort in rigdial.py
+BINARY = struct.Struct('<2sBBIddBBf12s')    # Must match StatePublisher.BINARY
+RESTART = 1000          # A sequence number this far backwards, or 1, means RigDial restarted rather than reordering
+
+
+def decode(data):
+    if data[:2] == b'RD':
+        magic, version, flags, seq, t, vfo, split, ptt, power, mode = BINARY.unpack(data)
+        return dict(v=version, seq=seq, time=t, hb=bool(flags & 1), vfo=vfo, mode=mode.rstrip(b'\0').decode('utf-8'),
+                split=split, ptt=ptt, power=power)
+    return json.loads(data)
+
+
+if __name__ == "__main__":
+    group = sys.argv[1] if len(sys.argv) > 1 else GROUP
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else PORT
+
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    s.bind(('', port))
+    first = group.split('.')[0]
+    if first.isdigit() and 224 <= int(first) <= 239:
+        s.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, struct.pack('4s4s', socket.inet_aton(group), socket.inet_aton('0.0.0.0')))
+    s.settimeout(1)
+
+    last_seq = None
+    received = lost = reordered = restarts = 0
+    window = 0
+    window_start = time.time()
+    while True:
+        try:
+            data, addr = s.recvfrom(1024)
+        except socket.timeout:
+            data = None
+        if data is not None:
+            state = decode(data)
+            received += 1
+            window += 1
+            if last_seq is not None and (state['seq'] == 1 or state['seq'] < last_seq - RESTART):
+                print("Publisher restarted, sequence went from %d to %d" % (last_seq, state['seq']))
+                restarts += 1
+                last_seq = None
+            if last_seq is not None:
+                if state['seq'] > last_seq + 1:
+                    lost += state['seq'] - last_seq - 1
+                elif state['seq'] <= last_seq:
+                    reordered += 1
+            if last_seq is None or state['seq'] > last_seq:
+                last_seq = state['seq']
+            print("%s seq %d %s vfo %.0f mode %s split %d ptt %d power %.0f latency %.1f ms" % (addr[0], state['seq'],
+                    'HB ' if state['hb'] else 'CHG', state['vfo'], state['mode'], state['split'], state['ptt'],
+                    state['power'], (time.time() - state['time']) * 1000))
+
+        now = time.time()
+        if now - window_start >= 10:
+            print("%.1f datagrams/s, %d received, %d lost, %d out of order, %d restarts" % (window / (now - window_start),
+                    received, lost, reordered, restarts))
+            window = 0
+            window_start = now
@@ -0,0 +1,138 @@
+#!/usr/bin/python3
+
+# replaydial.py
+#
+# Feed a RigDial event journal back through Wheel's decoder and the normal button, shuttle and jog handlers,
+# with a mock rig standing in for Flrig. Prints the rig commands that were recorded next to the ones the replay
+# produced, so a "jump" seen on air can be reproduced exactly. With --bench it just times the decode path.
+# If the ring has wrapped, the mock rig starts from its defaults rather than the real rig state, so early
+# frequencies will differ even though the deltas match.
+#
+# Shuttle tuning is replayed by calling ShuttleTuner.step() at each journaled tick, with the shuttle value and
+# elapsed time the live ticker saw. Limitations: the replay starts with the default Settings, so if the ring has
+# wrapped the shuttle mode and jog step may differ from what was in use; and DX spots are not journaled, so
+# spot jumps and spot walking find nothing.
+#
+# python3 replaydial.py rigdial.journal [--realtime] [--bench] [--device=ShuttleXpress] [--mappings=file.json]
+#
+# Settings are loaded the same way rigdial.py does, so a Settings.MappingFile is used. --mappings replays with
+# a different mapping file, e.g. one copied from the station that made the journal.
+#
+# The journal does not record which device a report came from. Give --device to use the mappings for that
+# product name, otherwise only the mappings without a device apply.
+
+# This program is free software: you can redistribute it and/or modify it under the terms of the GNU General Public
+# License as published by the Free Software Foundation, either version 3 of the License, or (at your option) any later version.
+# This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+# You should have received a copy of the GNU General Public License along with this program. If not,
+# see <https://www.gnu.org/licenses/>.
+
+# Having said that, it would be great to know if this software gets used. If you want, buy me a coffee, or send me some hardware
+# Darryl Smith, VK2TDS. darryl@radio-active.net.au Copyright 2023
+
+import sys
+import time
+import logging
+
+import rigdial
+from rigdial import Journal
+
+
+class MockRig:
+    # Stands in for TellFlrig. Holds the same properties and logs every command in the same form as the journal
+
+    def __init__(self):
+        self.commands = []
+        self.vfo = 14074000.0
+        self.ptt = 0
+        self.power = 50
+        self.mic_gain = 50
+        self.split = 0
+        self.mode = "USB-D"
+        self.commands = []      # Forget the defaults above
+
+    def __setattr__(self, name, value):
+        if name in Journal.RIG_COMMANDS:
+            self.commands.append((name, float(value)))
+        object.__setattr__(self, name, value)
+
+    def mod_vfoA(self, mod):
+        self.commands.append(('mod_vfoA', float(mod)))
+
+    def mod_vfoB(self, mod):
+        self.commands.append(('mod_vfoB', float(mod)))
+
+    def mod_vol(self, mod):
+        self.commands.append(('mod_vol', float(mod)))
+
+
+def replay(filename, realtime=False, bench=False, device=None, mappings=None):
+    with open(filename, 'rb') as fh:
+        buffer = fh.read()
+    records = list(Journal.records(buffer))
+
+    # The handlers in rigdial.py use module globals, so set those up the same way __main__ does
+    rigdial.log = logging.getLogger("app.replay")
+    rigdial.settings = rigdial.Settings()
+    if mappings is not None:
+        rigdial.settings.MappingFile = mappings
+    rigdial.settings.load()
+    rigdial.f = rigdial.Freq()
+    rigdial.t = MockRig()
+    rigdial.w = rigdial.Wheel(bind=False)
+    tuner = rigdial.ShuttleTuner(rigdial.t, rigdial.f, rigdial.settings.ShuttleRates, rigdial.settings.ShuttleTickRate,
+            rigdial.settings.ShuttlePauseOnEdge, None, rigdial.settings.SpotWalkRates)
+    rigdial.tuner = tuner
+    if not bench:
+        d = rigdial.Dispatcher(rigdial.settings.Mappings)
+        rigdial.w.on_button(d.button)
+        rigdial.w.on_shuttle(d.shuttle)
+        rigdial.w.on_jog(d.jog)
+
+    recorded = []
+    reports = 0
+    start = time.perf_counter_ns()
+    first_ns = None
+    for now_ns, kind, code, a, b, value, raw in records:
+        if kind == Journal.RIG:
+            recorded.append((Journal.RIG_COMMANDS[code], value))
+        if kind == Journal.TICK and not bench:
+            tuner.step(a, bool(code), value)
+        if kind != Journal.HID:
+            continue
+        if realtime:
+            if first_ns is None:
+                first_ns = now_ns
+            wait = (now_ns - first_ns) - (time.perf_counter_ns() - start)
+            if wait > 0:
+                time.sleep(wait / 1e9)
+        rigdial.w.decode(raw[:a], now_ns, device)
+        reports += 1
+    elapsed = time.perf_counter_ns() - start
+
+    if bench:
+        print("Decoded %d reports in %.3f ms, %.0f ns per report" % (reports, elapsed / 1e6, elapsed / max(reports, 1)))
+        return
+
+    replayed = rigdial.t.commands
+    print("%d records, %d HID reports, %d rig commands recorded, %d replayed" % (len(records), reports, len(recorded), len(replayed)))
+    for n in range(max(len(recorded), len(replayed))):
+        rec = recorded[n] if n < len(recorded) else None
+        rep = replayed[n] if n < len(replayed) else None
+        print("%s %-28s %-28s" % (' ' if rec == rep else '*', rec, rep))
+
+
+if __name__ == "__main__":
+    logging.getLogger().setLevel(logging.WARNING)
+    if len(sys.argv) < 2:
+        print("Usage: replaydial.py journal [--realtime] [--bench] [--device=name] [--mappings=file]")
+        sys.exit(1)
+    device = None
+    mappings = None
+    for arg in sys.argv:
+        if arg.startswith('--device='):
+            device = arg[len('--device='):]
+        if arg.startswith('--mappings='):
+            mappings = arg[len('--mappings='):]
+    replay(sys.argv[1], realtime='--realtime' in sys.argv, bench='--bench' in sys.argv, device=device, mappings=mappings)
@@ -17,25 +17,39 @@
 # Having said that, it would be great to know if this software gets used. If you want, buy me a coffee, or send me some hardware
 # Darryl Smith, VK2TDS. darryl@radio-active.net.au Copyright 2023
 
-import hid                  # For some reason I needed to add the path to this library in my .zprofile 
 import binascii
 import pprint
 import time
 import sys
+import os
 import socket
 import logging
 import logging.handlers
 import xmlrpc.client
+import struct
+import mmap
+import json
+import bisect
+import re
 
 from subprocess import Popen, PIPE
-from threading import Thread
+from threading import Thread, Lock
+from collections import deque
 
 #pip3 install pyusb
 
-# MAYBE, we can register a callback to be notified about device
-# add/remove (https://github.com/pyusb/pyusb/pull/160)
-from usb import core
-from usb import util
+# hid and usb are only needed to bind a real device. Without them replaydial.py can still drive Wheel(bind=False)
+try:
+    import hid                  # For some reason I needed to add the path to this library in my .zprofile 
+
+    # MAYBE, we can register a callback to be notified about device
+    # add/remove (https://github.com/pyusb/pyusb/pull/160)
+    from usb import core
+    from usb import util
+except ImportError:
+    hid = None
+    core = None
+    util = None
 
 
 class Freq():
@@ -63,6 +77,19 @@ class Freq():
         # Assuming HF
         self.band_order = ["160M", "80M", "40M", "30M", "20M", "17M",  "15M", "12M", "10M", "10MC",  "6M"]
 
+        # Band edges (IARU Region 3), used to stop continuous shuttle tuning running off the end of a band.
+        # Your licence may be narrower (VK is 1800-1875 and 3500-3800 kHz) or other regions differ; edit to suit
+        self.edges = {"160M": (1800000, 2000000),
+                "80M": (3500000, 3900000),
+                "40M": (7000000, 7300000),
+                "30M": (10100000, 10150000),
+                "20M": (14000000, 14350000),
+                "17M": (18068000, 18168000),
+                "15M": (21000000, 21450000),
+                "12M": (24890000, 24990000),
+                "10M": (28000000, 29700000),
+                "6M": (50000000, 54000000)}
+
 
     def getBand(self, f):
         # Choose band based on frequency
@@ -86,19 +113,199 @@ class Freq():
             return ("10M")
         return ("6M")       
 
+    def findBand(self, f):
+        # The band whose edges contain f, or None. Unlike getBand this says None for 60m, VHF and above
+        for band, (low, high) in self.edges.items():
+            if low <= f <= high:
+                return band
+        return None
+
+
+
+class SpotIndex():
+    # DX cluster spots, kept per band as a sorted list of frequencies with the callsigns alongside, so the
+    # next or previous spot from the VFO is one bisect. Re-spotting a call replaces its old entry. Spots expire
+    # in arrival order from a deque, so expiry only ever looks at the oldest spots. Only spots inside the band
+    # edges in Freq are kept, so a jump can never send the rig to 60m, VHF or anywhere else it should not go.
+
+    def __init__(self, freq, expiry=1800):
+        self.f = freq
+        self.expiry = expiry            # Seconds a spot stays active
+        self.freqs = {}                 # band -> sorted list of frequencies
+        self.calls = {}                 # band -> callsigns, in the same order as freqs
+        self.latest = {}                # (band, call) -> (frequency, time) of the current spot for that call
+        self.arrivals = deque()         # (time, band, call) oldest first
+        self.lock = Lock()
+
+    def __len__(self):
+        return len(self.latest)
+
+    def _remove(self, band, call, freq):
+        freqs = self.freqs[band]
+        calls = self.calls[band]
+        i = bisect.bisect_left(freqs, freq)
+        while i < len(freqs) and freqs[i] == freq:
+            if calls[i] == call:
+                del freqs[i]
+                del calls[i]
+                return
+            i += 1
+
+    def _expire(self, now):
+        while self.arrivals and self.arrivals[0][0] < now - self.expiry:
+            when, band, call = self.arrivals.popleft()
+            spot = self.latest.get((band, call))
+            if spot is not None and spot[1] == when:    # Not re-spotted since
+                del self.latest[(band, call)]
+                self._remove(band, call, spot[0])
+
+    def add(self, freq, call, now=None):
+        if now is None:
+            now = time.monotonic()
+        band = self.f.findBand(freq)
+        if band is None:
+            return
+        with self.lock:
+            self._expire(now)
+            old = self.latest.get((band, call))
+            if old is not None:
+                self._remove(band, call, old[0])
+            freqs = self.freqs.setdefault(band, [])
+            calls = self.calls.setdefault(band, [])
+            i = bisect.bisect_right(freqs, freq)
+            freqs.insert(i, freq)
+            calls.insert(i, call)
+            self.latest[(band, call)] = (freq, now)
+            self.arrivals.append((now, band, call))
+
+    def next(self, vfo, direction, guard=50, now=None):
+        # The nearest spot more than guard Hz above (direction > 0) or below the VFO, on the same band.
+        # Returns (frequency, call) or None
+        if now is None:
+            now = time.monotonic()
+        band = self.f.findBand(vfo)
+        with self.lock:
+            self._expire(now)
+            freqs = self.freqs.get(band, [])
+            if direction > 0:
+                i = bisect.bisect_right(freqs, vfo + guard)
+            else:
+                i = bisect.bisect_left(freqs, vfo - guard) - 1
+            if 0 <= i < len(freqs):
+                return (freqs[i], self.calls[band][i])
+        return None
+
+
+
+class Journal():
+    # Always-on flight recorder. Every raw HID report, decoded event and rig command is written as a fixed size
+    # record into a preallocated ring buffer, so nothing is allocated per event and the oldest records are
+    # overwritten once it is full. If a filename is given the ring is memory-mapped to that file, so the last
+    # few minutes survive a crash and can be fed back in with replaydial.py. The previous file is kept as .1
+    #
+    # Header:  magic, record size, capacity, total records ever written (the ring position is count % capacity)
+    # Record:  perf_counter_ns, kind, code, a, b, value, raw[raw]
+    #
+    # raw must hold the largest HID report, or replay would decode a shortened report and shift every bit
+    # field. It is at least 8 bytes (32 byte records) and is recovered from the record size when reading.
+
+    HEADER = struct.Struct('<4sIIQ12x')
+    FIELDS = '<qBBhid'
+    MAGIC = b'RDJ1'
+
+    HID = 1         # raw = report, a = report length
+    BUTTON = 2      # code = button number, a = state
+    SHUTTLE = 3     # a = shuttle value
+    JOG = 4         # code = jog value, a = delta value, b = delta time (ms), value = velocity
+    RIG = 5         # code = index into RIG_COMMANDS, value = argument
+    TICK = 6        # ShuttleTuner tick. code = walk, a = shuttle value, value = seconds since the last tick
+
+    RIG_COMMANDS = ['vfo', 'ptt', 'mod_vfoA', 'mod_vfoB', 'mod_vol', 'power', 'mic_gain', 'split']
+
+    def __init__(self, capacity=65536, filename=None, raw=8):
+        self.capacity = capacity
+        self.raw = max(raw, 8)
+        self.record = struct.Struct('%s%ds' % (self.FIELDS, self.raw))
+        self.count = 0
+        self.lock = Lock()
+        self.file = None
+        size = self.HEADER.size + capacity * self.record.size
+        if filename is None:
+            self.buffer = bytearray(size)
+        else:
+            # Keep the previous session's journal, it is the evidence if we are restarting after a crash
+            if os.path.exists(filename):
+                os.replace(filename, filename + '.1')
+            self.file = open(filename, 'w+b')
+            self.file.truncate(size)
+            self.buffer = mmap.mmap(self.file.fileno(), size)
+        self.HEADER.pack_into(self.buffer, 0, self.MAGIC, self.record.size, capacity, 0)
+
+    def write(self, now_ns, kind, code=0, a=0, b=0, value=0.0, raw=b''):
+        with self.lock:
+            offset = self.HEADER.size + (self.count % self.capacity) * self.record.size
+            self.record.pack_into(self.buffer, offset, now_ns, kind, code, a, b, value, raw)
+            self.count += 1
+            self.HEADER.pack_into(self.buffer, 0, self.MAGIC, self.record.size, self.capacity, self.count)
+
+    def hid(self, now_ns, report):
+        if len(report) > self.raw:
+            raise ValueError("HID report of %d bytes does not fit the %d byte journal records" % (len(report), self.raw))
+        self.write(now_ns, self.HID, a=len(report), raw=report)
+
+    def button(self, now_ns, button_number, value):
+        self.write(now_ns, self.BUTTON, code=button_number, a=int(value))
+
+    def shuttle(self, now_ns, value):
+        self.write(now_ns, self.SHUTTLE, a=value)
+
+    def jog(self, now_ns, value, delta_value, delta_time, velocity):
+        self.write(now_ns, self.JOG, code=value, a=delta_value, b=delta_time, value=velocity)
+
+    def tick(self, now_ns, value, walk, dt):
+        self.write(now_ns, self.TICK, code=int(walk), a=value, value=dt)
+
+    def rig(self, command, value):
+        self.write(time.perf_counter_ns(), self.RIG, code=self.RIG_COMMANDS.index(command), value=float(value))
+
+    def close(self):
+        if self.file is not None:
+            self.buffer.flush()
+            self.buffer.close()
+            self.file.close()
+            self.file = None
+
+    @classmethod
+    def records(cls, buffer):
+        # Yield (now_ns, kind, code, a, b, value, raw) tuples oldest first from a journal buffer or file contents
+        magic, size, capacity, count = cls.HEADER.unpack_from(buffer, 0)
+        fixed = struct.calcsize(cls.FIELDS)
+        if magic != cls.MAGIC or size < fixed + 8:
+            raise ValueError("Not a RigDial journal")
+        record = struct.Struct('%s%ds' % (cls.FIELDS, size - fixed))
+        first = max(0, count - capacity)
+        for n in range(first, count):
+            offset = cls.HEADER.size + (n % capacity) * size
+            yield record.unpack_from(buffer, offset)
+
 
 
 class Wheel():
     # This class will do callbacks when data is receieved.
 
-    def __init__(self):
+    def __init__(self, bind=True):
+        # bind=False skips USB enumeration so the decoder can be driven from a journal without any hardware
         #self.supported_devices = supported_devices
         self.devices_to_bind = {}
+        self.journal = None
+        self.now_ns = 0
+        self.device = None          # Product name of the device the current report came from
 
         self.shuttle_value = 0 
         self.jog_value = None
         self.jog_time = None
         self.buttons = [False, False, False, False, False] 
+        self.button_mask = 0        # Same as self.buttons, as bits, for the dispatch table
 
         self.jog_callbacks = []
         self.shuttle_callbacks = []
@@ -123,6 +330,11 @@ class Wheel():
                             }
         }
 
+        if not bind:
+            return
+        if hid is None or core is None:
+            raise ImportError("hid and pyusb are needed to bind a device. Try pip3 install hid pyusb")
+
         usb_device = None
             # we can enumarate with vendor_id and product_id as well, useful after some
             # type of hotplug event
@@ -164,6 +376,7 @@ class Wheel():
                                                            (manufacturer, product),
                                                            []).\
                                     append({'path': dev.get('path'),
+                                            'product': product,
                                             'packet_size': interface[0].
                                             wMaxPacketSize}
                                            )
@@ -182,17 +395,27 @@ class Wheel():
         
 
     def button(self, button_number, value):
+        if value:
+            self.button_mask |= 1 << button_number
+        else:
+            self.button_mask &= ~(1 << button_number)
+        if self.journal is not None:
+            self.journal.button (self.now_ns, button_number, value)
         if self.button_callbacks is not None:
             for callback in self.button_callbacks:
                 callback(self, button_number, value)
 
 
     def shuttle(self, value):
+        if self.journal is not None:
+            self.journal.shuttle (self.now_ns, value)
         if self.button_callbacks is not None:
             for callback in self.shuttle_callbacks:
                 callback(self, value)
         
     def jog (self, value, delta_value, delta_time, velocity):
+        if self.journal is not None:
+            self.journal.jog (self.now_ns, value, delta_value, delta_time, velocity)
         if self.jog_callbacks is not None:
             for callback in self.jog_callbacks:
                 callback(self, value, delta_value, delta_time, velocity)
@@ -225,92 +448,103 @@ class Wheel():
 
     # open a device and read it's data
     # on linux we can open hidraw directly; check if we can do it on macos as well
-    def read_device(self, path, packet_size):
+    def read_device(self, path, packet_size, product=None):
         d = hid.Device(path=path)
 
         while True:
             # macos keep reading "0000000000000000" (or "0100000000000000") while
             # idle
-            data = binascii.hexlify(d.read(packet_size)).decode()
-            x = int (data, 16)
+            report = d.read(packet_size)
+            self.decode (report, time.perf_counter_ns(), product)
 
-            if (x & 0x1000):
-                if self.buttons[0] == False:
-                    self.buttons[0] = True
-                    self.button(0, self.buttons[0])
-            else:
-                if self.buttons[0] == True:
-                    self.buttons[0] = False
-                    self.button(0, self.buttons[0]) 
-            if (x & 0x2000):
-                if self.buttons[1] == False:
-                    self.buttons[1] = True
-                    self.button(1, self.buttons[1])
-            else:
-                if self.buttons[1] == True:
-                    self.buttons[1] = False
-                    self.button(1, self.buttons[1]) 
-            if (x & 0x4000):
-                if self.buttons[2] == False:
-                    self.buttons[2] = True
-                    self.button(2, self.buttons[2])
-            else:
-                if self.buttons[2] == True:
-                    self.buttons[2] = False
-                    self.button(2, self.buttons[2]) 
-            if (x & 0x8000):
-                if self.buttons[3] == False:
-                    self.buttons[3] = True
-                    self.button(3, self.buttons[3])
-            else:
-                if self.buttons[3] == True:
-                    self.buttons[3] = False
-                    self.button(3, self.buttons[3]) 
-            if (x & 0x0001):
-                if self.buttons[4] == False:
-                    self.buttons[4] = True
-                    self.button(4, self.buttons[4])
-            else:
-                if self.buttons[4] == True:
-                    self.buttons[4] = False
-                    self.button(4, self.buttons[4]) 
-            shuttle_value = (x & 0x0F00000000) >> 32
-            if (shuttle_value > 8):
-                shuttle_value = -(16 - shuttle_value)
-            if self.shuttle_value != shuttle_value:
-                self.shuttle_value = shuttle_value
-                self.shuttle (self.shuttle_value)
-
-            jog_value = (x & 0x00FF000000) >> 24
+        d.close()
 
-            if self.jog_value == None:
-                self.jog_value = jog_value
+    def decode(self, report, now_ns, product=None):
+        # Turn one raw HID report into button, shuttle and jog callbacks. This is split out from read_device
+        # so that a journal can be fed back through exactly the same code. now_ns is a perf_counter_ns timestamp,
+        # product the name of the device it came from, which the Dispatcher uses to pick device mappings
+        self.now_ns = now_ns
+        self.device = product
+        if self.journal is not None:
+            self.journal.hid (now_ns, report)
+        data = binascii.hexlify(report).decode()
+        x = int (data, 16)
+
+        if (x & 0x1000):
+            if self.buttons[0] == False:
+                self.buttons[0] = True
+                self.button(0, self.buttons[0])
+        else:
+            if self.buttons[0] == True:
+                self.buttons[0] = False
+                self.button(0, self.buttons[0]) 
+        if (x & 0x2000):
+            if self.buttons[1] == False:
+                self.buttons[1] = True
+                self.button(1, self.buttons[1])
+        else:
+            if self.buttons[1] == True:
+                self.buttons[1] = False
+                self.button(1, self.buttons[1]) 
+        if (x & 0x4000):
+            if self.buttons[2] == False:
+                self.buttons[2] = True
+                self.button(2, self.buttons[2])
+        else:
+            if self.buttons[2] == True:
+                self.buttons[2] = False
+                self.button(2, self.buttons[2]) 
+        if (x & 0x8000):
+            if self.buttons[3] == False:
+                self.buttons[3] = True
+                self.button(3, self.buttons[3])
+        else:
+            if self.buttons[3] == True:
+                self.buttons[3] = False
+                self.button(3, self.buttons[3]) 
+        if (x & 0x0001):
+            if self.buttons[4] == False:
+                self.buttons[4] = True
+                self.button(4, self.buttons[4])
+        else:
+            if self.buttons[4] == True:
+                self.buttons[4] = False
+                self.button(4, self.buttons[4]) 
+        shuttle_value = (x & 0x0F00000000) >> 32
+        if (shuttle_value > 8):
+            shuttle_value = -(16 - shuttle_value)
+        if self.shuttle_value != shuttle_value:
+            self.shuttle_value = shuttle_value
+            self.shuttle (self.shuttle_value)
 
-            if self.jog_time == None:
-                self.jog_time = round(time.time()*1000)
-            delta_time = round(time.time()*1000) - self.jog_time
-            self.jog_time = round(time.time()*1000)            
+        jog_value = (x & 0x00FF000000) >> 24
 
-            if self.jog_value != jog_value:
-                delta_value = jog_value - self.jog_value
-                if delta_value < -128:
-                    delta_value = delta_value + 256
-                if delta_value > 120:
-                    delta_value = delta_value - 256
+        if self.jog_value == None:
+            self.jog_value = jog_value
 
-                self.jog_value = jog_value
+        now = now_ns // 1000000     # milliseconds
+        if self.jog_time == None:
+            self.jog_time = now
+        delta_time = now - self.jog_time
+        self.jog_time = now
 
-                velocity = (delta_value/delta_time) * 1000 * 3.5
+        if self.jog_value != jog_value:
+            delta_value = jog_value - self.jog_value
+            if delta_value < -128:
+                delta_value = delta_value + 256
+            if delta_value > 120:
+                delta_value = delta_value - 256
 
-                self.jog (self.jog_value, delta_value, delta_time, velocity)
+            self.jog_value = jog_value
 
+            velocity = (delta_value/delta_time) * 1000 * 3.5
 
-        d.close()
+            self.jog (self.jog_value, delta_value, delta_time, velocity)
 
     def go(self):
         for d in self.devices_to_bind.keys():
             for h in self.devices_to_bind[d]:
-                Thread(target=self.read_device, args=(h['path'], h['packet_size'])).start()
+                Thread(target=self.read_device, args=(h['path'], h['packet_size'], h['product'])).start()
         
 
 
@@ -323,8 +557,9 @@ class TellFlrig:
         self.port = port
         self.connected = False
         self.s = None
-        self.inThread = False
-
+        self.lock = Lock()          # One XML-RPC request at a time. The HID, shuttle tuner and main threads all share self.s
+        self.journal = None
+        self.publisher = None
 
 
     def connect (self):
@@ -343,139 +578,118 @@ class TellFlrig:
 
     @property
     def vfo (self):
-        while self.inThread:
-          True
-        self.inThread = True
-        r = float(self.s.rig.get_vfo())
-        self.inThread = False
+        with self.lock:
+            r = float(self.s.rig.get_vfo())
         return r
         
     @vfo.setter
     def vfo(self, freq):
-        while self.inThread:
-          True
-        self.inThread = True
-        r = self.s.rig.set_vfo(float(freq))
-        self.inThread = False
+        if self.journal is not None:
+            self.journal.rig ('vfo', freq)
+        with self.lock:
+            r = self.s.rig.set_vfo(float(freq))
+        if self.publisher is not None:     # Only once the write has gone through
+            self.publisher.update (vfo=freq)
         return r
         
     @property
     def ptt (self):
-        while self.inThread:
-          True
-        self.inThread = True
-        r = self.s.rig.get_ptt()
-        self.inThread = False
+        with self.lock:
+            r = self.s.rig.get_ptt()
         return r
         
     @ptt.setter
     def ptt (self, state):
-        while self.inThread:
-          True
-        self.inThread = True
-        r = self.s.rig.set_verify_ptt(state)
-        self.inThread = False
+        if self.journal is not None:
+            self.journal.rig ('ptt', state)
+        with self.lock:
+            r = self.s.rig.set_verify_ptt(state)
+        if self.publisher is not None:
+            self.publisher.update (ptt=state)
         return r
         
     #@mod_vfoA.setter
     def mod_vfoA(self, mod):
-        while self.inThread:
-          True
-        self.inThread = True
-        r = self.s.rig.mod_vfoA (float(mod))
-        self.inThread = False
+        if self.journal is not None:
+            self.journal.rig ('mod_vfoA', mod)
+        with self.lock:
+            r = self.s.rig.mod_vfoA (float(mod))
         return r
 
     #@mod_vfoB.setter
     def mod_vfoB(self, mod):
-        while self.inThread:
-          True
-        self.inThread = True
-        r = self.s.rig.mod_vfoB (float(mod))
-        self.inThread = False
+        if self.journal is not None:
+            self.journal.rig ('mod_vfoB', mod)
+        with self.lock:
+            r = self.s.rig.mod_vfoB (float(mod))
         return r
 
 
     #@mod_vol.setter
     def mod_vol(self, mod):
-        while self.inThread:
-          True
-        self.inThread = True
-        r = self.s.rig.mod_vol (float(mod))
-        self.inThread = False
+        if self.journal is not None:
+            self.journal.rig ('mod_vol', mod)
+        with self.lock:
+            r = self.s.rig.mod_vol (float(mod))
         return r
 
     @property
     def power(self):
-        while self.inThread:
-          True
-        self.inThread = True
-        r =  self.s.rig.get_power ()
-        self.inThread = False
+        with self.lock:
+            r =  self.s.rig.get_power ()
         return r
 
     @power.setter
     def power(self, mod):
-        while self.inThread:
-          True
-        self.inThread = True
-        r = self.s.rig.set_verify_power (mod)
-        self.inThread = False
+        if self.journal is not None:
+            self.journal.rig ('power', mod)
+        with self.lock:
+            r = self.s.rig.set_verify_power (mod)
+        if self.publisher is not None:
+            self.publisher.update (power=mod)
         return r
 
 
     @property
     def mic_gain (self):
-        while self.inThread:
-          True
-        self.inThread = True
-        r = self.s.rig.get_micgain()
-        self.inThread = False
+        with self.lock:
+            r = self.s.rig.get_micgain()
         return r
         
     @mic_gain.setter
     def mic_gain (self, gain):
-        while self.inThread:
-          True
-        self.inThread = True
-        r = self.s.rig.set_verify_micgain(gain)
-        self.inThread = False
+        if self.journal is not None:
+            self.journal.rig ('mic_gain', gain)
+        with self.lock:
+            r = self.s.rig.set_verify_micgain(gain)
         return r
 
     @property
     def mode (self):
-        while self.inThread:
-          True
-        self.inThread = True
-        r = self.s.rig.get_mode()
-        self.inThread = False
+        with self.lock:
+            r = self.s.rig.get_mode()
         return r
 
     @property
     def split (self):
-        while self.inThread:
-          True
-        self.inThread = True
-        r = self.s.rig.get_split()
-        self.inThread = False
+        with self.lock:
+            r = self.s.rig.get_split()
         return r
 
     @property
     def split (self):
-        while self.inThread:
-          True
-        self.inThread = True
-        r = float(self.s.rig.get_split())
-        self.inThread = False
+        with self.lock:
+            r = float(self.s.rig.get_split())
         return r
         
     @split.setter
     def split(self, s):
-        while self.inThread:
-          True
-        self.inThread = True
-        r = self.s.rig.set_verify_split(int(s))
-        self.inThread = False
+        if self.journal is not None:
+            self.journal.rig ('split', s)
+        with self.lock:
+            r = self.s.rig.set_verify_split(int(s))
+        if self.publisher is not None:
+            self.publisher.update (split=s)
         return r
 
 
@@ -529,6 +743,231 @@ class rigctldFake:
       True
 
 
+class SpotFeed:
+    # Reads a telnet DX cluster and adds every spot to a SpotIndex. Lines look like
+    #   DX de VK2TDS:     14074.0  JA1ABC       FT8 -12 dB                     0123Z
+    # clusterdial.py is a local stand-in cluster for testing.
+
+    SPOT = re.compile(r'^DX de [^:]+:\s+(\d+(?:\.\d+)?)\s+(\S+)')
+
+    def __init__(self, endpoint, port, callsign, index):
+        self.endpoint = endpoint
+        self.port = port
+        self.callsign = callsign
+        self.index = index
+
+    def parse(self, line):
+        m = self.SPOT.match(line)
+        if m is None:
+            return None
+        return (round(float(m.group(1)) * 1000), m.group(2))  # Cluster frequencies are in kHz, with or without decimals
+
+    def loop(self):
+        while True:
+            try:
+                with socket.create_connection((self.endpoint, self.port)) as s:
+                    log.info ("Connected to DX cluster %s:%d" % (self.endpoint, self.port))
+                    fh = s.makefile('rb')
+                    s.sendall (b'%s\r\n' % (bytes(self.callsign, encoding='utf-8')))
+                    for line in fh:
+                        spot = self.parse(line.decode('utf-8', 'replace'))
+                        if spot is not None:
+                            self.index.add(*spot)
+            except socket.error as exc:
+                log.info( "Caught exception socket.error : %s" % (exc))
+            time.sleep(10)
+
+    def go(self):
+        Thread (target=self.loop).start()
+
+
+class ShuttleTuner:
+    # Continuous tuning from the shuttle ring. The shuttle handler only records the deflection (-7..+7); a ticker
+    # thread running at a fixed rate turns that into VFO steps. Each tick applies rate * elapsed time, so the
+    # tuning speed does not depend on how often HID reports arrive, and at most one write goes to the rig per tick.
+    # The write is made from the ticker thread itself, so if Flrig is slow the ticks stretch out instead of
+    # queueing up. Optionally stops at the band edges in Freq until the shuttle is released or reversed.
+    # With walk set it steps from spot to spot in a SpotIndex instead, at walk_rates spots per second.
+    # Ticks that do anything are journaled with what they saw, so replaydial.py can call step() with the same
+    # values and get the same VFO writes.
+
+    def __init__(self, rig, freq, rates, tick_rate, pause_on_edge, spots=None, walk_rates=None):
+        self.rig = rig
+        self.freq = freq
+        self.rates = rates              # Hz per second for each shuttle position 0..7
+        self.spots = spots
+        self.walk_rates = walk_rates    # Spots per second for each shuttle position 0..7
+        self.walk = False
+        self.credit = 1.0               # Spots owed while walking. Starts at one so the first step is immediate
+        self.period = 1.0 / tick_rate
+        self.pause_on_edge = pause_on_edge
+        self.value = 0
+        self.vfo = None                 # Our own copy of the VFO while tuning, so we do not read it back every tick
+        self.written = None
+        self.band = None
+        self.paused = 0                 # Direction we stopped in at a band edge, 0 if not paused
+        self.last = time.perf_counter()
+        self.active = False             # Last tick had the shuttle deflected
+        self.journal = None
+
+    def set(self, value, walk=False):
+        # Called from the HID thread. Just remember the deflection, the ticker does the rest
+        self.walk = walk
+        self.value = value
+
+    def moved(self):
+        # Something else set the VFO. Forget our copy so the next tick reads it back instead of snapping back
+        self.vfo = None
+
+    def tick(self):
+        now = time.perf_counter()
+        dt = now - self.last
+        self.last = now
+
+        value = self.value
+        walk = self.walk
+        if self.journal is not None and (value != 0 or self.active):
+            self.journal.tick (time.perf_counter_ns(), value, walk, dt)
+        self.active = value != 0
+        self.step (value, walk, dt)
+
+    def step(self, value, walk, dt):
+        if value == 0:
+            self.vfo = None
+            self.paused = 0
+            self.credit = 1.0
+            return
+        direction = 1 if value > 0 else -1
+
+        if walk:
+            if self.spots is None:
+                return
+            self.credit = min(self.credit + self.walk_rates[min(abs(value), len(self.walk_rates) - 1)] * dt, 1.0)
+            if self.credit < 1.0:
+                return
+            self.credit -= 1.0
+            if self.vfo is None:
+                self.vfo = self.rig.vfo
+            spot = self.spots.next(self.vfo, direction)
+            if spot is not None:
+                self.vfo = spot[0]
+                log.info ("Spot %s on %.1f kHz" % (spot[1], spot[0] / 1000))
+                self.rig.vfo = self.vfo
+            return
+        if self.paused:
+            if direction == self.paused:
+                return
+            self.paused = 0
+
+        if self.vfo is None:
+            self.vfo = self.rig.vfo
+            self.written = self.vfo
+            self.band = self.freq.getBand(self.vfo)
+
+        previous = self.vfo
+        self.vfo = self.vfo + direction * self.rates[min(abs(value), len(self.rates) - 1)] * dt
+
+        # Only pause when this tick crosses an edge. If we started outside the band, clamping would jump the
+        # VFO backwards onto the edge
+        if self.pause_on_edge and self.band in self.freq.edges:
+            low, high = self.freq.edges[self.band]
+            if direction > 0 and previous < high <= self.vfo:
+                self.vfo = high
+                self.paused = direction
+                log.info ("Shuttle tuning paused at top of %s" % (self.band))
+            if direction < 0 and previous > low >= self.vfo:
+                self.vfo = low
+                self.paused = direction
+                log.info ("Shuttle tuning paused at bottom of %s" % (self.band))
+
+        vfo = round(self.vfo)
+        if vfo != self.written:
+            self.written = vfo
+            self.rig.vfo = vfo
+
+    def run(self):
+        next_tick = time.perf_counter()
+        while True:
+            try:
+                self.tick()
+            except Exception as exc:
+                log.info ("Shuttle tuning failed: %s" % (exc))
+                self.vfo = None
+            # Schedule from the previous tick, but never try to catch up after a slow write
+            next_tick = max(next_tick + self.period, time.perf_counter())
+            time.sleep(max(0, next_tick - time.perf_counter()))
+
+    def go(self):
+        Thread (target=self.run).start()
+
+
+class StatePublisher:
+    # Sends a datagram whenever vfo, mode, split, ptt or power changes, plus a heartbeat every few seconds, so any
+    # number of loggers and displays can listen without polling us or Flrig. The destination can be a unicast,
+    # broadcast or multicast address. Every datagram carries the whole state and a sequence number, so listeners
+    # can spot gaps and reordering. listendial.py is a listener for checking delivery.
+    #
+    # json:    {"v": 1, "seq": n, "time": t, "hb": false, "vfo": f, "mode": "USB", "split": 0, "ptt": 0, "power": p}
+    # binary:  magic 'RD', version, flags (bit 0 heartbeat), seq, time, vfo, split, ptt, power, mode (12 bytes)
+
+    VERSION = 1
+    BINARY = struct.Struct('<2sBBIddBBf12s')
+
+    def __init__(self, host, port, format='json', heartbeat=5, ttl=1):
+        self.address = (host, port)
+        self.format = format
+        self.heartbeat = heartbeat
+        self.seq = 0
+        self.lock = Lock()
+        self.state = {'vfo': 0.0, 'mode': '', 'split': 0, 'ptt': 0, 'power': 0.0}
+        self.s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if host == '<broadcast>' or host.endswith('.255'):
+            self.s.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        first = host.split('.')[0]
+        if first.isdigit() and 224 <= int(first) <= 239:
+            self.s.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+        log.info ("Publishing state to %s:%d as %s" % (host, port, format))
+
+    def update(self, **fields):
+        # Only sends if something actually changed
+        with self.lock:
+            changed = False
+            for k, v in fields.items():
+                if k == 'mode':
+                    v = str(v)
+                elif k in ('vfo', 'power'):
+                    v = float(v)
+                else:
+                    v = int(float(v))
+                if self.state[k] != v:
+                    self.state[k] = v
+                    changed = True
+            if changed:
+                self.send(False)
+
+    def send(self, heartbeat):
+        self.seq = (self.seq + 1) & 0xFFFFFFFF
+        st = self.state
+        if self.format == 'binary':
+            data = self.BINARY.pack(b'RD', self.VERSION, 1 if heartbeat else 0, self.seq, time.time(),
+                    st['vfo'], st['split'], st['ptt'], st['power'], st['mode'].encode('utf-8'))
+        else:
+            data = json.dumps(dict(v=self.VERSION, seq=self.seq, time=time.time(), hb=heartbeat, **st)).encode('utf-8')
+        try:
+            self.s.sendto(data, self.address)
+        except socket.error as exc:
+            log.info( "Caught exception socket.error : %s" % (exc))
+
+    def loop(self):
+        while True:
+            time.sleep(self.heartbeat)
+            with self.lock:
+                self.send(True)
+
+    def go(self):
+        Thread (target=self.loop).start()
+
+
 def get_vfo(r, t):
     # Take the 'telnet' radio settings and send them to the 'rigctldFake' class. 
     # We no longer use r.taint, but set it just in case
@@ -541,7 +980,7 @@ def get_vfo(r, t):
         r.mode = temp
         r.taint = True
     temp = t.split
-    if t.split != temp:
+    if r.split != temp:
         r.split = temp
         r.taint = True
  
@@ -555,112 +994,291 @@ def get_vfo(r, t):
 
 
 
-def button(self, button_number, value):
-    
-    # This handler is ONLY when button presses are used without the JOG or SHUTTLE wheel
-    #
-    log.info ("Event Button %d state %d" % (button_number, value))
-    # Voice PTT whilst button 0 is pressed.
-    if (button_number == 0) & (value == 0):
-        log.debug ("PTT Off")
-        t.ptt = 0
-    if (button_number == 0) & (value == 1):
-        log.debug ("PTT On")
-        t.ptt = 1
-    if (button_number == 0) & (value == 1):
-        log.debug ("Nothing happens")
-    if (button_number == 2) & (value == 1):
-        # Toggle the minimum frequency change between 10 and 1000, on button down
+class Action:
+    # Base class for anything a control can be mapped to. Button actions are called as (w, value), shuttle
+    # actions as (w, value) and jog actions as (w, value, delta_value, delta_time, velocity). Parameters from
+    # the mapping are passed to the constructor as keyword arguments. PARAMS lists the ones an action takes,
+    # with their defaults, and each becomes an attribute.
+
+    PARAMS = {}
+
+    def __init__(self, **params):
+        for k in params:
+            if k not in self.PARAMS:
+                raise ValueError("%s does not take a '%s' parameter" % (type(self).__name__, k))
+        for k, v in self.PARAMS.items():
+            setattr(self, k, params.get(k, v))
+
+    def __call__(self, w, value, *args):
+        pass
+
+
+class Ptt(Action):
+    # Voice PTT whilst the button is held
+    def __call__(self, w, value, *args):
+        if value:
+            log.debug ("PTT On")
+            t.ptt = 1
+        else:
+            log.debug ("PTT Off")
+            t.ptt = 0
+
+
+class ToggleStep(Action):
+    # Toggle the minimum frequency change between settings.freqChangeSmall and settings.freqChangeBig
+    def __call__(self, w, value, *args):
         if settings.minFreqChange == settings.freqChangeBig:
             settings.minFreqChange = settings.freqChangeSmall
         else:
             settings.minFreqChange = settings.freqChangeBig
         log.info ("Minimum frequency change is now %d" % (settings.minFreqChange))
-        #t.send(b"+t\n")
-    if (button_number == 3):
-        log.debug ("Button index 3 is controlled by JOG - Mic Gain")
-    if (button_number == 4):
-        log.debug ("Button index 4 is controlled by JOG - Power")
-        
-memoryIndex = -1
-maxShuttle = 0
-direction = 0
-def shuttle(self, value):
-    # This routine uses the shuttle. When you turn it a bit and return to zero, the band changes up and down
-    # It changes to the last known frequency on that band. It resets any split too
 
-    global maxShuttle
-    global direction
-    global memoryIndex
-    global f # Doesnt need to be a global, but makes it plain
-    global t # Doesnt need to be a global, but makes it plain
 
-    log.info ("Event Shuttle value %d" %(value))
+class ToggleShuttleMode(Action):
+    # Cycle the shuttle between band hopping, continuous tuning and walking the DX spots. 'spots' is skipped
+    # unless there is a SpotIndex to walk
+    PARAMS = {'modes': ('band', 'tune', 'spots')}
 
-    if value == 0: # Do something on return to zero. 
-        if maxShuttle < 0:
-            direction = -1
+    def __call__(self, w, value, *args):
+        modes = [m for m in self.modes if m != 'spots' or spots is not None]
+        if settings.ShuttleMode in modes:
+            settings.ShuttleMode = modes[(modes.index(settings.ShuttleMode) + 1) % len(modes)]
         else:
-            direction = 1
-        maxShuttle = 0
-        
-        if memoryIndex != 0:
-            memoryIndex += direction
-            memoryIndex = memoryIndex % (len(f.freq))        
-        else:
-            memoryIndex = list(f.freq).index('B15M')
-                        
-                
-        
-        #currentF = t.vfo
-        #currentBand = f.getBand (currentF)
-        
-        #index = f.band_order.index (currentBand) 
-        #newBand = f.band_order[(index + direction) % len(f.band_order)] # determine the new band
-        #print (list(f.freq.keys())[1])
-        #newBand = f.freq[list(f.freq.keys())[(memoryIndex)]]
-        newF = list(f.freq.keys())[(memoryIndex)]
-        log.info ("New Band - %s %s %s" % (memoryIndex, newF, f.freq[newF]))
-        t.vfo = f.freq[newF] # Set new frequency
-        t.split = 0 # reset the split too. Turn it off
-
-    if abs(value) > 1: # Make sure that the user turns a bit. Without this line, letting go once turned sometimes goes the other way
-        if abs(value) > abs(maxShuttle):
-            maxShuttle = value       
-
-
-def jog (self, value, delta_value, delta_time, velocity):
-    log.info ("Event Jog Value %d Delta Value %d Delta Time %d Velocity %d" % (value, delta_value, delta_time, velocity))
-    if w.buttons[3]:
+            settings.ShuttleMode = modes[0]
+        if tuner is not None:
+            tuner.set (0)
+        log.info ("Shuttle mode is now %s" % (settings.ShuttleMode))
+
+
+class AdjustPower(Action):
+    # Jog changes the power by delta_value * step
+    PARAMS = {'step': 1}
+
+    def __call__(self, w, value, delta_value, delta_time, velocity):
         pwr = t.power
-        pwr = pwr + delta_value
+        pwr = pwr + delta_value * self.step
         t.power = pwr
         log.info ("Setting power level to %f" % (pwr))
-        return
-    if w.buttons[4]:
-        mic_gain = t.mic_gain
-        log.info ("Setting Mic Gain %f" % (mic_gain))
-        mic_gain = mic_gain + delta_value
-        t.mic_gain = mic_gain 
-        return
 
-    # Assuming NO BUTTONS ARE PRESSED!!!
-    vfo = t.vfo
-    # Depending on how fast the Jog Wheel is moving, we use a multiplier to make the frequency change bigger. 
-    mult = 1.0
-    if abs(velocity) < 30:
-        mult = 1.0
-    elif abs(velocity) < 60:
-        mult = 4.0
-    elif abs(velocity) < 90:
-        mult = 9.0
-    else:
-        mult = 15.0
-    vfo = vfo + ( settings.minFreqChange * delta_value * mult)
-    log.info ("Setting new VFO frequency %f" % (vfo))
-    t.vfo = vfo
 
+class AdjustMicGain(Action):
+    # Jog changes the mic gain by delta_value * step
+    PARAMS = {'step': 1}
 
+    def __call__(self, w, value, delta_value, delta_time, velocity):
+        mic_gain = t.mic_gain
+        log.info ("Setting Mic Gain %f" % (mic_gain))
+        mic_gain = mic_gain + delta_value * self.step
+        t.mic_gain = mic_gain
+
+
+class Tune(Action):
+    # Jog changes the VFO. Depending on how fast the Jog Wheel is moving, we use a multiplier to make the
+    # frequency change bigger. velocities are the thresholds between the multipliers
+    PARAMS = {'velocities': (30, 60, 90), 'multipliers': (1.0, 4.0, 9.0, 15.0)}
+
+    def __call__(self, w, value, delta_value, delta_time, velocity):
+        vfo = t.vfo
+        mult = self.multipliers[-1]
+        for n, v in enumerate(self.velocities):
+            if abs(velocity) < v:
+                mult = self.multipliers[n]
+                break
+        vfo = vfo + ( settings.minFreqChange * delta_value * mult)
+        log.info ("Setting new VFO frequency %f" % (vfo))
+        t.vfo = vfo
+        if tuner is not None:
+            tuner.moved ()
+
+
+class BandHop(Action):
+    # When you turn the shuttle a bit and return to zero, the band changes up and down
+    # It changes to the last known frequency on that band. It resets any split too
+    # The first hop goes to the start memory, after that it steps up and down the memories in Freq
+
+    PARAMS = {'start': 'B15M'}
+
+    def __init__(self, **params):
+        super().__init__(**params)
+        if self.start not in Freq().freq:
+            raise ValueError("BandHop start '%s' is not one of the memories in Freq" % (self.start))
+        self.memoryIndex = None
+        self.maxShuttle = 0
+        self.direction = 0
+
+    def __call__(self, w, value, *args):
+        if value == 0: # Do something on return to zero.
+            if self.maxShuttle < 0:
+                self.direction = -1
+            else:
+                self.direction = 1
+            self.maxShuttle = 0
+
+            if self.memoryIndex is None:
+                self.memoryIndex = list(f.freq).index(self.start)
+            else:
+                self.memoryIndex += self.direction
+                self.memoryIndex = self.memoryIndex % (len(f.freq))
+
+            newF = list(f.freq.keys())[(self.memoryIndex)]
+            log.info ("New Band - %s %s %s" % (self.memoryIndex, newF, f.freq[newF]))
+            t.vfo = f.freq[newF] # Set new frequency
+            if tuner is not None:
+                tuner.moved ()
+            t.split = 0 # reset the split too. Turn it off
+
+        if abs(value) > 1: # Make sure that the user turns a bit. Without this line, letting go once turned sometimes goes the other way
+            if abs(value) > abs(self.maxShuttle):
+                self.maxShuttle = value
+
+
+class ShuttleTune(Action):
+    # Continuous tuning. The ShuttleTuner ticker applies the steps, we just pass on the deflection
+    walk = False
+
+    def __call__(self, w, value, *args):
+        if tuner is not None:
+            tuner.set (value, self.walk)
+
+
+class SpotWalk(ShuttleTune):
+    # The ShuttleTuner ticker steps from spot to spot instead of tuning
+    walk = True
+
+
+class SpotJump(Action):
+    # Jog jumps to the next or previous DX spot from the current VFO
+    def __call__(self, w, value, delta_value, delta_time, velocity):
+        if spots is None or delta_value == 0:
+            return
+        spot = spots.next(t.vfo, delta_value)
+        if spot is None:
+            log.info ("No more spots in that direction")
+            return
+        log.info ("Spot %s on %.1f kHz" % (spot[1], spot[0] / 1000))
+        t.vfo = spot[0]
+        if tuner is not None:
+            tuner.moved ()
+
+
+ACTIONS = {'none': Action,
+        'ptt': Ptt,
+        'toggle_step': ToggleStep,
+        'toggle_shuttle_mode': ToggleShuttleMode,
+        'power': AdjustPower,
+        'mic_gain': AdjustMicGain,
+        'tune': Tune,
+        'band_hop': BandHop,
+        'shuttle_tune': ShuttleTune,
+        'spot_walk': SpotWalk,
+        'spot_jump': SpotJump}
+
+
+class Dispatcher:
+    # Compiles the declarative control mappings in settings into a single dictionary keyed by (device, control,
+    # bitmask of the other buttons held, shuttle mode), so each event is one lookup instead of a chain of ifs.
+    # The device is the product name Wheel bound, e.g. 'ShuttleXpress'. Devices no mapping names share the
+    # entries under None.
+    #
+    # A mapping is a dictionary:
+    #   control    'button0'..'button4', 'jog' or 'shuttle'
+    #   event      buttons only: 'down', 'up', or leave out for both
+    #   modifiers  list of button numbers that must be held. Others may be held too
+    #   mode       settings.ShuttleMode this mapping applies in. Leave out for all modes
+    #   device     product name this mapping applies to. Leave out for all devices
+    #   action     a name from ACTIONS
+    #   params     keyword arguments for the action
+    # The first mapping that matches wins, so put the ones with modifiers before the plain ones.
+    # Mistakes in a mapping raise ValueError when it is compiled rather than being silently ignored.
+
+    BUTTONS = 5
+    CONTROLS = ['button%d' % n for n in range(BUTTONS)] + ['jog', 'shuttle']
+    MODES = ['band', 'tune', 'spots']
+    FIELDS = ['control', 'event', 'modifiers', 'mode', 'device', 'action', 'params']
+
+    def check(self, n, m):
+        def fail(message):
+            raise ValueError("Control mapping %d %s: %s" % (n, m, message))
+        for k in m:
+            if k not in self.FIELDS:
+                fail("unknown field '%s', expected one of %s" % (k, ', '.join(self.FIELDS)))
+        if m.get('control') not in self.CONTROLS:
+            fail("unknown control '%s', expected one of %s" % (m.get('control'), ', '.join(self.CONTROLS)))
+        if 'event' in m and (m['event'] not in ('down', 'up') or not m['control'].startswith('button')):
+            fail("event must be 'down' or 'up', and only for buttons")
+        for b in m.get('modifiers', []):
+            if b not in range(self.BUTTONS):
+                fail("modifier %s is not a button number 0..%d" % (b, self.BUTTONS - 1))
+        if 'mode' in m and m['mode'] not in self.MODES:
+            fail("unknown mode '%s', expected one of %s" % (m['mode'], ', '.join(self.MODES)))
+        if m.get('action') not in ACTIONS:
+            fail("unknown action '%s', expected one of %s" % (m.get('action'), ', '.join(ACTIONS)))
+        try:
+            return ACTIONS[m['action']](**m.get('params', {}))
+        except ValueError as exc:
+            fail(exc)
+
+    def match(self, actions, device, control, event, mask, mode):
+        # The first mapping that applies to this combination, or None
+        name = {True: 'down', False: 'up', None: None}[event]
+        for m, action in actions:
+            if m['control'] != control:
+                continue
+            if m.get('device') not in (None, device):
+                continue
+            if m.get('event') not in (None, name):
+                continue
+            if m.get('mode') not in (None, mode):
+                continue
+            required = 0
+            for b in m.get('modifiers', []):
+                required |= 1 << b
+            if mask & required == required:
+                return action
+        return None
+
+    def __init__(self, mappings):
+        self.table = {}
+        controls = [('button%d' % n, e) for n in range(self.BUTTONS) for e in (True, False)]
+        controls += [('jog', None), ('shuttle', None)]
+        actions = []
+        for n, m in enumerate(mappings):
+            actions.append((m, self.check(n, m)))
+        self.devices = set(m['device'] for m, action in actions if 'device' in m)
+
+        for device in list(self.devices) + [None]:
+            for control, event in controls:
+                for mask in range(1 << self.BUTTONS):
+                    for mode in self.MODES:
+                        action = self.match(actions, device, control, event, mask, mode)
+                        if action is not None:
+                            self.table[(device, control, event, mask, mode)] = action
+        log.info ("Compiled %d control mappings into %d dispatch entries" % (len(actions), len(self.table)))
+
+    def device(self, w):
+        return w.device if w.device in self.devices else None
+
+    def button(self, w, button_number, value):
+        log.info ("Event Button %d state %d" % (button_number, value))
+        action = self.table.get((self.device(w), 'button%d' % button_number, bool(value), w.button_mask & ~(1 << button_number), settings.ShuttleMode))
+        if action is not None:
+            action (w, value)
+
+    def shuttle(self, w, value):
+        log.info ("Event Shuttle value %d" %(value))
+        action = self.table.get((self.device(w), 'shuttle', None, w.button_mask, settings.ShuttleMode))
+        if action is not None:
+            action (w, value)
+
+    def jog(self, w, value, delta_value, delta_time, velocity):
+        log.info ("Event Jog Value %d Delta Value %d Delta Time %d Velocity %d" % (value, delta_value, delta_time, velocity))
+        action = self.table.get((self.device(w), 'jog', None, w.button_mask, settings.ShuttleMode))
+        if action is not None:
+            action (w, value, delta_value, delta_time, velocity)
+
+
+tuner = None
+spots = None
 
 
 class Settings:
@@ -673,11 +1291,47 @@ class Settings:
         self.freqChangeSmall = 10
         self.freqChangeBig = 1000
         self.minFreqChange = self.freqChangeSmall
+        self.ShuttleMode = 'band'               # 'band' hops bands on twist and return, 'tune' tunes continuously, 'spots' walks DX spots
+        self.ShuttleRates = [0, 10, 50, 200, 1000, 3000, 10000, 30000]  # Hz per second at each shuttle position
+        self.ShuttleTickRate = 10               # VFO writes per second while shuttle tuning. Keep within what Flrig can absorb
+        self.ShuttlePauseOnEdge = True          # Stop shuttle tuning at the band edges in Freq
+        self.MappingFile = None                 # JSON file with a list of mappings to use instead of the ones below
+        self.Mappings = [                       # See Dispatcher. First match wins
+            {'control': 'button0', 'action': 'ptt'},
+            {'control': 'button1', 'event': 'down', 'action': 'toggle_shuttle_mode'},
+            {'control': 'button2', 'event': 'down', 'action': 'toggle_step'},
+            {'control': 'jog', 'modifiers': [3, 4], 'action': 'spot_jump'},
+            {'control': 'jog', 'modifiers': [3], 'action': 'power', 'params': {'step': 1}},
+            {'control': 'jog', 'modifiers': [4], 'action': 'mic_gain', 'params': {'step': 1}},
+            {'control': 'jog', 'action': 'tune'},
+            {'control': 'shuttle', 'mode': 'tune', 'action': 'shuttle_tune'},
+            {'control': 'shuttle', 'mode': 'spots', 'action': 'spot_walk'},
+            {'control': 'shuttle', 'action': 'band_hop', 'params': {'start': 'B15M'}}]
+        self.Publish = True                     # Send state changes over UDP for loggers and displays
+        self.PublishHost = '239.255.0.73'       # Multicast group, broadcast address or a single host
+        self.PublishPort = 4533
+        self.PublishFormat = 'json'             # 'json' or 'binary'
+        self.PublishHeartbeat = 5               # Seconds between heartbeats when nothing changes
+        self.PublishTTL = 1                     # Multicast hops. 1 keeps it on the local network
+        self.Spots = False                      # Read DX spots from a telnet cluster
+        self.SpotHost = '127.0.0.1'
+        self.SpotPort = 7300
+        self.SpotCall = 'N0CALL'                # Callsign to log in to the cluster with
+        self.SpotExpiry = 1800                  # Seconds a spot stays active
+        self.SpotWalkRates = [0, 0.5, 1, 2, 3, 5, 8, 12]    # Spots per second at each shuttle position
+        self.JournalCapacity = 65536            # Records in the event journal ring buffer, 32 bytes each for reports up to 8 bytes
+        self.JournalFile = 'rigdial.journal'    # Memory-mapped journal file. None keeps the journal in RAM only
         #TODO Also need to manage Freq.freq[] in settings at some stage.
 
+    def load(self):
+        if self.MappingFile is not None:
+            with open(self.MappingFile) as fh:
+                self.Mappings = json.load(fh)
+
 if __name__ == "__main__":
 
     settings = Settings()
+    settings.load()
     f = Freq()
 
     # Change root logger level from WARNING (default) to NOTSET in order for all messages to be delegated.
@@ -693,12 +1347,13 @@ if __name__ == "__main__":
     log = logging.getLogger("app." + __name__)
 
     log.info ("Jog: Change VFO Frequency. Push Button 4 or 5 and whilst turning to adjust Mic Gain and Power")
-    log.info ("Shuttle: Unused")
+    log.info ("Shuttle: Turn and return to zero to change band up and down, or hold to tune continuously")
     log.info ("Button 1: Push and hold for PTT")
-    log.info ("Button 2: Turn and return to zero to change band up and down")
+    log.info ("Button 2: Cycle the shuttle between band change, continuous tuning and, with Spots on, walking DX spots")
     log.info ("Button 3: Toggle between 10Hz and 1000Hz minimum VFO changes on Jog")
     log.info ("Button 4: Push whilst Jog to adjust Mic Gain")
     log.info ("Button 5: Push whilst Jog to adjust Power")
+    log.info ("Buttons 4 and 5: Push both whilst Jog to jump between DX spots")
 #
 
     #log.debug('Debug message, should only appear in the file.')
@@ -708,9 +1363,15 @@ if __name__ == "__main__":
 
 
     w = Wheel ()
-    w.on_button (button)
-    w.on_shuttle (shuttle)
-    w.on_jog (jog)
+
+    # Size the journal records to hold the biggest report any bound device can send
+    packet_size = max([h['packet_size'] for d in w.devices_to_bind.values() for h in d] + [8])
+    j = Journal (settings.JournalCapacity, settings.JournalFile, packet_size)
+    w.journal = j
+    d = Dispatcher (settings.Mappings)
+    w.on_button (d.button)
+    w.on_shuttle (d.shuttle)
+    w.on_jog (d.jog)
     w.go()
     
     if settings.MacLoggerDX:
@@ -721,12 +1382,37 @@ if __name__ == "__main__":
 
     log.info ("Starting")
     t = TellFlrig (settings.FlrigDestHost, settings.FlrigDestPort)
+    t.journal = j
     t.connect()
+
+    if settings.Publish:
+        p = StatePublisher (settings.PublishHost, settings.PublishPort, settings.PublishFormat, settings.PublishHeartbeat, settings.PublishTTL)
+        t.publisher = p
+        p.go()
+
+    if settings.Spots:
+        spots = SpotIndex (f, settings.SpotExpiry)
+        SpotFeed (settings.SpotHost, settings.SpotPort, settings.SpotCall, spots).go()
+
+    tuner = ShuttleTuner (t, f, settings.ShuttleRates, settings.ShuttleTickRate, settings.ShuttlePauseOnEdge, spots, settings.SpotWalkRates)
+    tuner.journal = j
+    tuner.go()
     
 
 
+    polls = 0
     while 1==1:
         if settings.MacLoggerDX:
             get_vfo(r, t) # Only poll the VFO on the radio if we are connected to MacLoggerDX
+        if settings.Publish:
+            # Catch changes made on the rig itself. Our own changes are published by the TellFlrig setters, so
+            # reuse what get_vfo just read, and only poll ptt and power once per heartbeat
+            if settings.MacLoggerDX:
+                p.update (vfo=r.vfo, mode=r.mode, split=r.split)
+            else:
+                p.update (vfo=t.vfo, mode=t.mode, split=t.split)
+            if polls % settings.PublishHeartbeat == 0:
+                p.update (ptt=t.ptt, power=t.power)
+            polls += 1
         time.sleep (1)        
         
\ No newline at end of file